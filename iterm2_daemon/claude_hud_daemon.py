@@ -14,9 +14,12 @@ import sys
 sys.dont_write_bytecode = True
 
 import asyncio
-import subprocess
+import itertools
+import logging
 import os
-from typing import Optional
+import re
+import time
+from typing import Dict, Optional, Tuple
 
 # Add scripts directory to path for imports
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -31,15 +34,87 @@ except ImportError:
 
 from state_detector import ClaudeState, ClaudeStateDetector
 from session_manager import SessionManager, TrackedSession
-from window_manager import WindowManager
+from window_manager import get_manager
 from socket_listener import SocketListener, SessionMapper
 
+logger = logging.getLogger("claude_hud")
+
+
+# Screen patterns for state detection, matched against lowercased text.
+# The bottom-most screen line matching any pattern decides the state; within
+# that line, groups are checked in order and the first group with a match wins.
+WAITING_PATTERNS = (
+    'do you want to proceed',
+    'yes, and always allow',
+    '? allow',
+    'esc to cancel',
+    'tab to add additional',
+    '1. yes',
+    '2. yes, and',
+    '3. no',
+)
+WORKING_PATTERNS = (
+    'ctrl+c to interrupt',  # Streaming indicator
+    'tokens)',              # Token counter during streaming
+    'running',
+    '● ',                   # Activity indicator
+    'waiting…',             # Waiting for async op
+    'explore(',             # Tool calls
+    'task(',
+    'bash(',
+    'read(',
+    'write(',
+    'edit(',
+    'glob(',
+    'grep(',
+    'webfetch(',
+    'websearch(',
+    'let me',
+    'i\'ll ',
+    'i will',
+    '+50 more tool',        # Tool expansion indicator
+    'ctrl+o to expand',
+)
+ERROR_PATTERNS = (
+    '[error]',
+    'error:',
+    'failed',
+    'exception',
+)
+DONE_PATTERNS = (
+    '✓',
+    '✔',
+    'completed',
+    'done!',
+)
+
+
+def _compile_alternation(patterns: Tuple[str, ...]) -> re.Pattern:
+    """Compile literal patterns into one regex so the text is scanned once."""
+    return re.compile('|'.join(re.escape(p) for p in patterns))
+
+
+_WAITING_RE = _compile_alternation(WAITING_PATTERNS)
+_WORKING_RE = _compile_alternation(WORKING_PATTERNS)
+_ERROR_RE = _compile_alternation(ERROR_PATTERNS)
+_DONE_RE = _compile_alternation(DONE_PATTERNS)
+_ANY_RE = _compile_alternation(
+    WAITING_PATTERNS + WORKING_PATTERNS + ERROR_PATTERNS + DONE_PATTERNS
+)
+
 
 class ClaudeHUDDaemon:
     """Main daemon for monitoring Claude Code sessions."""
 
-    POLL_INTERVAL = 0.5  # seconds
+    # Per-session screen-scrape interval: reset on change, backed off when quiet
+    MIN_POLL_INTERVAL = 0.25  # seconds
+    MAX_POLL_INTERVAL = 10.0  # seconds
+    POLL_BACKOFF = 1.5
+    SCREEN_HASH_LINES = 10  # bottom lines compared to detect an unchanged screen
+    HOOK_FRESH_WINDOW = 10.0  # seconds after a hook message that scraping is skipped
+    SCREEN_CACHE_TTL = 0.2  # seconds a fetched screen is reused; below MIN_POLL_INTERVAL
     CLAUDE_PROCESS_NAME = "claude"
+    CLEANUP_INTERVAL = 60.0  # seconds between safety sweeps for missed closes
 
     def __init__(self, connection: iterm2.Connection):
         """
@@ -51,9 +126,13 @@ class ClaudeHUDDaemon:
         self.connection = connection
         self.app = None
         self.session_manager = SessionManager()
-        self.window_manager = WindowManager()
-        self._detectors: dict = {}
-        self._monitored_sessions: set = set()
+        self.window_manager = get_manager()
+        # Fallback detector per tracked session; also the set of monitored sessions
+        self._detectors: Dict[str, ClaudeStateDetector] = {}
+        # session_id -> (time.monotonic() of fetch, screen contents)
+        self._screen_cache: Dict[str, Tuple[float, iterm2.ScreenContents]] = {}
+        # Wakes the monitor loop when a newly tracked session needs polling
+        self._poll_wakeup = asyncio.Event()
 
         # Hook-based state detection
         self.session_mapper = SessionMapper()
@@ -69,32 +148,82 @@ class ClaudeHUDDaemon:
         # Scan all existing sessions first
         await self._scan_existing_sessions()
 
+        # Safety sweep runs off a timer rather than a sleeping task
+        self._schedule_cleanup()
+
         # Start monitoring tasks (including socket listener for hooks)
         await asyncio.gather(
             self._monitor_sessions(),
             self._watch_for_new_sessions(),
-            self._cleanup_closed_sessions(),
+            self._watch_for_closed_sessions(),
             self.socket_listener.start(),  # Hook-based state updates
         )
 
     async def _scan_existing_sessions(self) -> None:
         """Scan all existing sessions and track any running Claude."""
-        print("Scanning existing sessions...")
+        logger.info("Scanning existing sessions...")
         for window in self.app.windows:
             for tab in window.tabs:
                 for session in tab.sessions:
                     await self._check_and_track_session(session.session_id)
 
     async def _monitor_sessions(self) -> None:
-        """Main monitoring loop for tracked sessions."""
+        """
+        Fallback monitoring loop for tracked sessions.
+
+        Hooks deliver state changes as they happen (see
+        _handle_hook_state_update). Each session is screen-scraped on its
+        own schedule: right after a change it is polled every
+        MIN_POLL_INTERVAL, backing off to MAX_POLL_INTERVAL while quiet.
+        Sessions a hook reported on within HOOK_FRESH_WINDOW are not
+        scraped at all.
+        """
+        loop = asyncio.get_running_loop()
         while True:
+            # Clear before taking the snapshot: a session tracked while this
+            # pass awaits sets the event again and the wait below returns at once
+            self._poll_wakeup.clear()
+            now = time.monotonic()
+            next_wake = now + self.MAX_POLL_INTERVAL
             try:
-                for session in self.session_manager.get_all_sessions():
-                    await self._update_session_state(session)
+                for tracked in self.session_manager.get_all_sessions():
+                    if tracked.next_poll_at <= now:
+                        last_hook = self.socket_listener.last_seen(tracked.iterm_session_id)
+                        if now - last_hook < self.HOOK_FRESH_WINDOW:
+                            changed = False
+                        else:
+                            changed = await self._update_session_state(tracked)
+                        self._schedule_next_poll(tracked, changed)
+                    next_wake = min(next_wake, tracked.next_poll_at)
             except Exception as e:
-                print(f"Error in monitor loop: {e}")
+                logger.exception("Error in monitor loop: %s", e)
+
+            # Sleep until the earliest deadline or until a new session arrives;
+            # a plain timer handle is cheaper than wait_for's task per iteration
+            timer = loop.call_later(
+                max(0.0, next_wake - time.monotonic()), self._poll_wakeup.set
+            )
+            await self._poll_wakeup.wait()
+            timer.cancel()
+
+    def _schedule_next_poll(self, tracked: TrackedSession, changed: bool) -> None:
+        """
+        Set when a session's screen should next be scraped.
 
-            await asyncio.sleep(self.POLL_INTERVAL)
+        Args:
+            tracked: The tracked session.
+            changed: Whether its state changed since the last poll.
+        """
+        if changed or tracked.current_state is ClaudeState.WAITING_INPUT:
+            # Just changed, or user-facing: keep polling closely
+            interval = self.MIN_POLL_INTERVAL
+        else:
+            interval = min(
+                max(tracked.poll_interval * self.POLL_BACKOFF, self.MIN_POLL_INTERVAL),
+                self.MAX_POLL_INTERVAL,
+            )
+        tracked.poll_interval = interval
+        tracked.next_poll_at = time.monotonic() + interval
 
     async def _watch_for_new_sessions(self) -> None:
         """Watch for new iTerm2 sessions that might be running Claude."""
@@ -103,15 +232,32 @@ class ClaudeHUDDaemon:
                 session_id = await monitor.async_get()
                 await self._check_and_track_session(session_id)
 
-    async def _cleanup_closed_sessions(self) -> None:
-        """Periodically clean up sessions that have been closed."""
-        while True:
-            try:
-                await self._cleanup_sessions()
-            except Exception as e:
-                print(f"Error in cleanup: {e}")
+    async def _watch_for_closed_sessions(self) -> None:
+        """Stop tracking sessions as soon as iTerm2 reports them closed."""
+        async with iterm2.SessionTerminationMonitor(self.connection) as monitor:
+            while True:
+                session_id = await monitor.async_get()
+                self._forget_session(session_id)
 
-            await asyncio.sleep(5)  # Check every 5 seconds
+    def _schedule_cleanup(self) -> None:
+        """
+        Arm the next sweep for closed sessions and stale windows.
+
+        Closed sessions are normally handled by _watch_for_closed_sessions;
+        this is a safety net, so it runs only every CLEANUP_INTERVAL.
+        """
+        asyncio.get_running_loop().call_later(
+            self.CLEANUP_INTERVAL, self._cleanup_closed_sessions
+        )
+
+    def _cleanup_closed_sessions(self) -> None:
+        """Run one cleanup sweep and re-arm the timer."""
+        try:
+            self._cleanup_sessions()
+        except Exception as e:
+            logger.exception("Error in cleanup: %s", e)
+
+        self._schedule_cleanup()
 
     async def _check_and_track_session(self, session_id: str) -> None:
         """
@@ -120,7 +266,7 @@ class ClaudeHUDDaemon:
         Args:
             session_id: The iTerm2 session ID.
         """
-        if session_id in self._monitored_sessions:
+        if session_id in self._detectors:
             return
 
         session = self.app.get_session_by_id(session_id)
@@ -133,6 +279,9 @@ class ClaudeHUDDaemon:
         # Check if this session is running Claude
         if await self._is_claude_session(session):
             await self._start_tracking_session(session)
+        else:
+            # Only tracked sessions are polled; don't hold this screen
+            self._screen_cache.pop(session_id, None)
 
     async def _is_claude_session(self, session: iterm2.Session) -> bool:
         """
@@ -144,24 +293,30 @@ class ClaudeHUDDaemon:
         Returns:
             True if the session appears to be running Claude Code.
         """
+        # Issue all three requests at once; one round trip instead of three
+        name, command, contents = await asyncio.gather(
+            session.async_get_variable("jobName"),
+            session.async_get_variable("commandLine"),
+            self._get_screen_contents(session),
+            return_exceptions=True,
+        )
+
         try:
-            # Get the session's variables
-            name = await session.async_get_variable("jobName")
-            if name and self.CLAUDE_PROCESS_NAME in name.lower():
+            # Check the session's variables
+            if isinstance(name, str) and self.CLAUDE_PROCESS_NAME in name.lower():
                 return True
 
             # Check command
-            command = await session.async_get_variable("commandLine")
-            if command and self.CLAUDE_PROCESS_NAME in command.lower():
+            if isinstance(command, str) and self.CLAUDE_PROCESS_NAME in command.lower():
                 return True
 
             # Check screen contents for Claude indicators
-            contents = await session.async_get_screen_contents()
+            if isinstance(contents, BaseException):
+                raise contents
             if contents:
-                text = ""
-                for line_num in range(contents.number_of_lines):
-                    line = contents.line(line_num)
-                    text += line.string + "\n"
+                text = "\n".join(
+                    contents.line(i).string for i in range(contents.number_of_lines)
+                )
 
                 # Look for Claude Code indicators
                 text_lower = text.lower()
@@ -173,7 +328,7 @@ class ClaudeHUDDaemon:
                     return True
 
         except Exception as e:
-            print(f"Error checking if Claude session: {e}")
+            logger.exception("Error checking if Claude session: %s", e)
             pass
 
         return False
@@ -186,17 +341,20 @@ class ClaudeHUDDaemon:
             session: The iTerm2 session.
         """
         session_id = session.session_id
-        if session_id in self._monitored_sessions:
+        if session_id in self._detectors:
             return
 
-        self._monitored_sessions.add(session_id)
+        # Create a detector for this session (fallback); claims it before any await
+        self._detectors[session_id] = ClaudeStateDetector()
 
-        # Get project info from working directory
-        try:
-            cwd = await session.async_get_variable("path")
-            project_path = cwd or "Unknown"
-        except Exception:
-            project_path = "Unknown"
+        # Get project info from working directory, and the original
+        # background color (set by grid script), in one round trip
+        cwd, original_color = await asyncio.gather(
+            session.async_get_variable("path"),
+            self._get_session_background_color(session),
+            return_exceptions=True,
+        )
+        project_path = cwd if isinstance(cwd, str) and cwd else "Unknown"
 
         # Get window name if available
         window = session.tab.window
@@ -213,27 +371,26 @@ class ClaudeHUDDaemon:
             window_name=window_name,
         )
 
-        # Query and store the original background color (set by grid script)
-        original_color = self._get_session_background_color(session_id)
-        if original_color:
+        # Store the original background color
+        if isinstance(original_color, str):
             tracked.original_bg_color = original_color
-            self.session_manager._save_state()
-            print(f"Stored original bg color for {tracked.project_name}: {original_color}")
+            self.session_manager._schedule_save()
+            logger.debug("Stored original bg color for %s: %s", tracked.project_name, original_color)
 
         # Register with session mapper for hook correlation
         self.session_mapper.register_iterm_session(session_id, project_path)
 
-        # Create a detector for this session (fallback)
-        self._detectors[session_id] = ClaudeStateDetector()
+        # Poll the new session right away
+        self._poll_wakeup.set()
 
-        print(f"Started tracking: {tracked.project_name} ({session_id})")
+        logger.info("Started tracking: %s (%s)", tracked.project_name, session_id)
 
     async def _handle_hook_state_update(
         self,
         iterm_session_id: str,
         state: ClaudeState,
         cwd: str
-    ) -> None:
+    ) -> bool:
         """
         Handle state update from Claude Code hook via socket.
         This is the primary state update path - more reliable than screen scraping.
@@ -242,18 +399,22 @@ class ClaudeHUDDaemon:
             iterm_session_id: The iTerm2 session ID.
             state: The detected state from hook.
             cwd: The working directory.
+
+        Returns:
+            True if the session is tracked and now reflects the state,
+            False if the update could not be applied yet.
         """
         session = self.app.get_session_by_id(iterm_session_id)
         if not session:
-            return
+            return False
 
         tracked = self.session_manager.get_session(iterm_session_id)
         if not tracked:
-            return
+            return False
 
         # Check if state changed
-        if state != tracked.current_state:
-            print(f"[Hook] State change: {tracked.project_name} {tracked.current_state} -> {state}")
+        if state is not tracked.current_state:
+            logger.info("[Hook] State change: %s %s -> %s", tracked.project_name, tracked.current_state, state)
             self.session_manager.update_session_state(iterm_session_id, state)
 
             # Update visual feedback (amber for WAITING_INPUT, restore original otherwise)
@@ -264,27 +425,34 @@ class ClaudeHUDDaemon:
                 tracked.original_bg_color,
             )
 
-    async def _update_session_state(self, tracked: TrackedSession) -> None:
+        return True
+
+    async def _update_session_state(self, tracked: TrackedSession) -> bool:
         """
         Update the state of a tracked session.
 
         Args:
             tracked: The tracked session.
+
+        Returns:
+            True if the state changed, False otherwise.
         """
         session = self.app.get_session_by_id(tracked.iterm_session_id)
         if not session:
-            return
+            return False
 
         # Detect state from screen contents
-        state = await self._detect_state_from_screen(session)
+        state = await self._detect_state_from_screen(session, tracked)
 
         # Check if state changed
-        if state != tracked.current_state:
-            print(f"State change: {tracked.project_name} {tracked.current_state} -> {state}")
+        if state is not tracked.current_state:
+            logger.info("State change: %s %s -> %s", tracked.project_name, tracked.current_state, state)
             self.session_manager.update_session_state(
                 tracked.iterm_session_id,
                 state,
             )
+            # Let the next hook report through even if it repeats its last state
+            self.socket_listener.forget_session(tracked.iterm_session_id)
 
             # Update visual feedback (amber for WAITING_INPUT, restore original otherwise)
             await self._update_visual_feedback(
@@ -293,150 +461,123 @@ class ClaudeHUDDaemon:
                 tracked.project_name,
                 tracked.original_bg_color,
             )
+            return True
+
+        return False
+
+    async def _get_screen_contents(self, session: iterm2.Session) -> iterm2.ScreenContents:
+        """
+        Fetch a session's screen, reusing a fetch from the last SCREEN_CACHE_TTL.
+
+        A new session is read by _is_claude_session and then polled right
+        away once tracked; this lets both use a single round trip.
 
-    async def _detect_state_from_screen(self, session: iterm2.Session) -> ClaudeState:
+        Args:
+            session: The iTerm2 session.
+
+        Returns:
+            The session's screen contents.
+        """
+        session_id = session.session_id
+        now = time.monotonic()
+        cached = self._screen_cache.get(session_id)
+        if cached and now - cached[0] < self.SCREEN_CACHE_TTL:
+            return cached[1]
+
+        contents = await session.async_get_screen_contents()
+        self._screen_cache[session_id] = (now, contents)
+        return contents
+
+    async def _detect_state_from_screen(
+        self,
+        session: iterm2.Session,
+        tracked: TrackedSession,
+    ) -> ClaudeState:
         """
         Detect Claude state by analyzing screen contents.
 
+        If the bottom of the screen is unchanged since the last poll, the
+        session's current state is returned without re-running detection.
+
         Args:
             session: The iTerm2 session.
+            tracked: The tracked session (holds the last screen hash).
 
         Returns:
             The detected ClaudeState.
         """
         try:
-            contents = await session.async_get_screen_contents()
+            contents = await self._get_screen_contents(session)
             if not contents:
                 return ClaudeState.IDLE
 
-            # Get last 30 lines of screen content
-            lines = []
-            for line_num in range(max(0, contents.number_of_lines - 30), contents.number_of_lines):
-                line = contents.line(line_num)
-                lines.append(line.string)
-
-            text = '\n'.join(lines).lower()
-
-            # Check for WAITING_INPUT patterns (highest priority)
-            waiting_patterns = [
-                'do you want to proceed',
-                'yes, and always allow',
-                '? allow',
-                'esc to cancel',
-                'tab to add additional',
-                '1. yes',
-                '2. yes, and',
-                '3. no',
-            ]
-            for pattern in waiting_patterns:
-                if pattern in text:
-                    return ClaudeState.WAITING_INPUT
-
-            # Check for WORKING patterns
-            working_patterns = [
-                'ctrl+c to interrupt',  # Streaming indicator
-                'tokens)',              # Token counter during streaming
-                'running',
-                '● ',                   # Activity indicator
-                'waiting…',             # Waiting for async op
-                'explore(',             # Tool calls
-                'task(',
-                'bash(',
-                'read(',
-                'write(',
-                'edit(',
-                'glob(',
-                'grep(',
-                'webfetch(',
-                'websearch(',
-                'let me',
-                'i\'ll ',
-                'i will',
-                '+50 more tool',        # Tool expansion indicator
-                'ctrl+o to expand',
-            ]
-            for pattern in working_patterns:
-                if pattern in text:
-                    return ClaudeState.WORKING
-
-            # Check for ERROR patterns
-            error_patterns = [
-                '[error]',
-                'error:',
-                'failed',
-                'exception',
-            ]
-            for pattern in error_patterns:
-                if pattern in text:
-                    return ClaudeState.ERROR
-
-            # Check for DONE patterns - just completed a response
-            done_patterns = [
-                '✓',
-                '✔',
-                'completed',
-                'done!',
-            ]
-            for pattern in done_patterns:
-                if pattern in text:
-                    # Only if no working indicators
-                    has_working = any(p in text for p in ['running', '● '])
-                    if not has_working:
-                        return ClaudeState.DONE
-
-            # Default to IDLE if at prompt
-            if '❯' in text or '> ' in text:
+            # Claude's status lives at the bottom; skip work if it hasn't moved
+            num_lines = contents.number_of_lines
+            tail_start = max(0, num_lines - self.SCREEN_HASH_LINES)
+            tail = [contents.line(i).string for i in range(tail_start, num_lines)]
+            screen_hash = hash(tuple(tail))
+            if screen_hash == tracked.screen_hash:
+                return tracked.current_state
+            tracked.screen_hash = screen_hash
+
+            # Last 30 lines of screen content, bottom line first, so the
+            # search stops at the newest output that matches anything
+            head = (contents.line(i).string for i in range(tail_start - 1, max(0, num_lines - 30) - 1, -1))
+            text = '\n'.join(itertools.chain(reversed(tail), head)).lower()
+
+            match = _ANY_RE.search(text)
+            if not match:
+                # At the prompt or nothing recognizable
                 return ClaudeState.IDLE
 
-            return ClaudeState.IDLE
+            # Decide on that line alone (patterns never span lines)
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            line_end = text.find('\n', match.end())
+            line = text[line_start:] if line_end == -1 else text[line_start:line_end]
+
+            # Check pattern groups in priority order
+            if _WAITING_RE.search(line):
+                return ClaudeState.WAITING_INPUT
+            if _WORKING_RE.search(line):
+                return ClaudeState.WORKING
+            if _ERROR_RE.search(line):
+                return ClaudeState.ERROR
+            # Just completed a response (working indicators were ruled out above)
+            return ClaudeState.DONE
 
         except Exception as e:
-            print(f"Error detecting state from screen: {e}")
+            logger.exception("Error detecting state from screen: %s", e)
             return ClaudeState.IDLE
 
-    def _run_applescript(self, script: str) -> bool:
-        """Run AppleScript and return success status."""
+    @staticmethod
+    def _color_to_rgb_string(color: iterm2.Color) -> str:
+        """Format an iTerm2 color as AppleScript RGB "{r, g, b}" (0-65535 channels)."""
+        # Colors read from a profile carry float 0-255 channels
+        r, g, b = (round(c) * 257 for c in (color.red, color.green, color.blue))
+        return f"{{{r}, {g}, {b}}}"
+
+    @staticmethod
+    def _rgb_string_to_color(rgb: str) -> Optional[iterm2.Color]:
+        """Parse an AppleScript RGB "{r, g, b}" string into an iTerm2 color."""
         try:
-            subprocess.run(
-                ["osascript", "-e", script],
-                capture_output=True,
-                timeout=5
-            )
-            return True
-        except Exception as e:
-            print(f"AppleScript error: {e}")
-            return False
+            # float() also accepts strings saved with fractional channels
+            r, g, b = (round(float(c) / 257) for c in rgb.strip("{} ").split(","))
+        except ValueError:
+            return None
+        return iterm2.Color(r, g, b)
 
-    def _get_session_background_color(self, session_id: str) -> Optional[str]:
-        """Query the current background color of a session via AppleScript.
+    async def _get_session_background_color(self, session: iterm2.Session) -> Optional[str]:
+        """Query the current background color of a session.
 
         Returns the color as AppleScript RGB format "{r, g, b}" or None if failed.
         """
-        script = f'''
-        tell application "iTerm2"
-            repeat with w in windows
-                repeat with t in tabs of w
-                    repeat with s in sessions of t
-                        if unique ID of s is "{session_id}" then
-                            set bgColor to background color of s
-                            return "{{" & (item 1 of bgColor) & ", " & (item 2 of bgColor) & ", " & (item 3 of bgColor) & "}}"
-                        end if
-                    end repeat
-                end repeat
-            end repeat
-        end tell
-        '''
         try:
-            result = subprocess.run(
-                ["osascript", "-e", script],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                return result.stdout.strip()
+            profile = await session.async_get_profile()
+            color = profile.background_color
+            if color:
+                return self._color_to_rgb_string(color)
         except Exception as e:
-            print(f"Error getting background color: {e}")
+            logger.exception("Error getting background color: %s", e)
         return None
 
     async def _update_visual_feedback(
@@ -456,41 +597,48 @@ class ClaudeHUDDaemon:
             original_bg_color: The original background color to restore to (AppleScript RGB format).
         """
         try:
-            session_id = session.session_id
-
             # Background color changes based on state:
             # - WAITING_INPUT: Dark red to grab attention
             # - Other states: Restore to original project color
-            if state == ClaudeState.WAITING_INPUT:
+            if state is ClaudeState.WAITING_INPUT:
                 # Dark red background - attention-grabbing but still readable
-                bg_rgb = "{35000, 8000, 8000}"  # Dark red
-                print(f"ATTENTION: {project_name} needs input!")
+                bg_color = iterm2.Color(136, 31, 31)  # Dark red
+                logger.info("ATTENTION: %s needs input!", project_name)
             elif original_bg_color:
                 # Restore to original project color
-                bg_rgb = original_bg_color
+                bg_color = self._rgb_string_to_color(original_bg_color)
             else:
-                # Fallback: don't change background if we don't know original
+                bg_color = None
+
+            # Fallback: don't change background if we don't know original
+            if not bg_color:
                 return
 
-            bg_script = f'''
-            tell application "iTerm2"
-                repeat with w in windows
-                    repeat with t in tabs of w
-                        repeat with s in sessions of t
-                            if unique ID of s is "{session_id}" then
-                                set background color of s to {bg_rgb}
-                            end if
-                        end repeat
-                    end repeat
-                end repeat
-            end tell
-            '''
-            self._run_applescript(bg_script)
+            # Set on the session only; the shared profile is left untouched
+            profile = iterm2.LocalWriteOnlyProfile()
+            profile.set_background_color(bg_color)
+            await session.async_set_profile_properties(profile)
 
         except Exception as e:
-            print(f"Error updating visual feedback: {e}")
+            logger.exception("Error updating visual feedback: %s", e)
+
+    def _forget_session(self, session_id: str) -> None:
+        """
+        Drop all state held for a closed iTerm2 session.
+
+        Args:
+            session_id: The iTerm2 session ID.
+        """
+        self._screen_cache.pop(session_id, None)
+        if self._detectors.pop(session_id, None) is None:
+            return
+
+        self.session_manager.untrack_session(session_id)
+        self.session_mapper.unregister_iterm_session(session_id)
+        self.socket_listener.forget_session(session_id)
+        logger.info("Cleaned up closed session: %s", session_id)
 
-    async def _cleanup_sessions(self) -> None:
+    def _cleanup_sessions(self) -> None:
         """Clean up sessions that have been closed."""
         # Get all current iTerm2 session IDs
         current_session_ids = set()
@@ -500,19 +648,15 @@ class ClaudeHUDDaemon:
                     current_session_ids.add(session.session_id)
 
         # Find and remove closed sessions
-        for session_id in list(self._monitored_sessions):
+        for session_id in list(self._detectors):
             if session_id not in current_session_ids:
-                self._monitored_sessions.discard(session_id)
-                self.session_manager.untrack_session(session_id)
-                if session_id in self._detectors:
-                    del self._detectors[session_id]
-                print(f"Cleaned up closed session: {session_id}")
+                self._forget_session(session_id)
 
         # Cleanup stale windows
         current_window_ids = [w.window_id for w in self.app.windows]
         removed = self.window_manager.cleanup_stale_windows(current_window_ids)
         for name in removed:
-            print(f"Cleaned up stale window: {name}")
+            logger.info("Cleaned up stale window: %s", name)
 
 
 async def main(connection: iterm2.Connection) -> None:
@@ -522,21 +666,33 @@ async def main(connection: iterm2.Connection) -> None:
     Args:
         connection: The iTerm2 connection.
     """
-    print("Claude HUD daemon starting...")
+    logger.info("Claude HUD daemon starting...")
 
     daemon = ClaudeHUDDaemon(connection)
 
     try:
         await daemon.start()
     except Exception as e:
-        print(f"Daemon error: {e}")
+        logger.exception("Daemon error: %s", e)
         raise
+    finally:
+        # Write out any state change still waiting on the save debounce
+        daemon.session_manager.flush()
+        daemon.window_manager.flush()
+        daemon.session_mapper.flush()
 
 
 # Entry point for iTerm2
 if __name__ == "__main__":
+    # Shows up in iTerm2's script console; per-message hook logs are DEBUG.
+    # Set CLAUDE_HUD_LOG_LEVEL (e.g. DEBUG, WARNING) to change verbosity.
+    log_level = logging.getLevelName(os.environ.get("CLAUDE_HUD_LOG_LEVEL", "INFO").upper())
+    logging.basicConfig(
+        level=log_level if isinstance(log_level, int) else logging.INFO,
+        format="%(message)s",
+    )
     try:
         iterm2.run_forever(main)
     except Exception as e:
-        print(f"Failed to start Claude HUD daemon: {e}")
+        logger.exception("Failed to start Claude HUD daemon: %s", e)
         sys.exit(1)
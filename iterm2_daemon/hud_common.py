@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Claude HUD - Shared helpers
+
+Helpers shared by the daemon modules: dataclass options, the JSON
+encoding used by the state files and the hook socket, and the debounced
+writer the managers persist their state files with.
+"""
+
+import sys
+sys.dont_write_bytecode = True
+
+import atexit
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    import asyncio
+
+# Pass as @dataclass(**DATACLASS_SLOTS). slots=True needs Python 3.10;
+# older interpreters keep a per-instance __dict__.
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# orjson is optional. Both parsers accept UTF-8 bytes directly and raise
+# JSONDecodeError (a ValueError subclass) on bad input. json_dumps returns
+# bytes: compact by default, two-space indented with indent=True. default
+# is only consulted for types the encoder can't handle itself (orjson
+# serializes dataclasses natively, the stdlib encoder does not).
+try:
+    import orjson
+    from orjson import JSONDecodeError
+    json_loads = orjson.loads
+
+    def json_dumps(
+        obj: Any,
+        indent: bool = False,
+        default: Optional[Callable[[Any], Any]] = None,
+    ) -> bytes:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_INDENT_2 if indent else 0)
+except ImportError:
+    import json
+    from json import JSONDecodeError
+    json_loads = json.loads
+
+    def json_dumps(
+        obj: Any,
+        indent: bool = False,
+        default: Optional[Callable[[Any], Any]] = None,
+    ) -> bytes:
+        if indent:
+            return json.dumps(obj, indent=2, default=default).encode('utf-8')
+        return json.dumps(obj, separators=(',', ':'), default=default).encode('utf-8')
+
+
+class DebouncedJsonWriter:
+    """
+    Coalesces saves of one state file and writes them atomically.
+
+    schedule() marks the state dirty. With an event loop running, one save
+    happens `delay` seconds later: the state is encoded on the loop thread
+    and the file is written off it. Without a loop (e.g. CLI use) the save
+    happens immediately. Pending changes are flushed at interpreter exit.
+
+    Writes are serialized by a lock, and each encoded state carries a
+    generation number, so an executor write still in flight can neither
+    interleave with a later one (or a synchronous flush) nor land after it.
+    """
+
+    def __init__(self, path: Path, encode: Callable[[], bytes], delay: float):
+        """
+        Args:
+            path: The state file.
+            encode: Returns the current state as JSON bytes.
+            delay: Seconds to coalesce saves for.
+        """
+        self.path = path
+        self._encode = encode
+        self._delay = delay
+        self._dirty = False
+        self._save_handle: Optional['asyncio.TimerHandle'] = None
+        self._generation = 0  # bumped (on the loop thread) each time the state is encoded
+        # Guarded by _lock; touched by the executor thread and by flush()
+        self._lock = threading.Lock()
+        self._written_generation = 0
+        self._last_payload: Optional[bytes] = None  # what the file currently holds
+        atexit.register(self.flush)
+
+    def mark_written(self, payload: bytes) -> None:
+        """Record bytes already on disk (e.g. just loaded) so an identical save is skipped."""
+        with self._lock:
+            self._last_payload = payload
+
+    def schedule(self) -> None:
+        """Mark the state dirty and arm a delayed save if none is pending."""
+        self._dirty = True
+        if self._save_handle is not None:
+            return
+
+        # Imported here so CLI status reads don't pay for asyncio at startup
+        import asyncio
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        self._save_handle = loop.call_later(self._delay, self._flush)
+
+    def _flush(self) -> None:
+        """Timer callback: encode on the loop thread, write in the executor."""
+        self._save_handle = None
+        if not self._dirty:
+            return
+
+        self._dirty = False
+        self._generation += 1
+        import asyncio
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, self._write, self._generation, self._encode())
+
+    def flush(self) -> None:
+        """Synchronously write any pending changes (e.g. on shutdown)."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+
+        if self._dirty:
+            self._dirty = False
+            self._generation += 1
+            self._write(self._generation, self._encode())
+
+    def _write(self, generation: int, payload: bytes) -> None:
+        """Replace the file with payload, unless it is stale or already on disk."""
+        with self._lock:
+            if generation < self._written_generation:
+                # A newer state was written while this one waited
+                return
+            if payload == self._last_payload:
+                self._written_generation = generation
+                return
+
+            # Write a uniquely named sibling file and rename it over the
+            # state so readers (hud-status) never see a partially written
+            # file. No fsync: this is UI state and losing the last update on
+            # power loss is fine.
+            import tempfile
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_name = tempfile.mkstemp(
+                    dir=self.path.parent, prefix=self.path.name + '.', suffix='.tmp'
+                )
+            except OSError:
+                return
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_name, self.path)
+            except OSError:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+                return
+
+            self._last_payload = payload
+            self._written_generation = generation
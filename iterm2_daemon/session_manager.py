@@ -9,16 +9,30 @@ Manages session state and provides aggregated status.
 import sys
 sys.dont_write_bytecode = True
 
-import json
+import time
+from collections import Counter
 from pathlib import Path
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
+from hud_common import DATACLASS_SLOTS, DebouncedJsonWriter, json_dumps, json_loads
 from state_detector import ClaudeState
 
 
-@dataclass
+def _to_epoch(value: Union[float, str, None]) -> Optional[float]:
+    """Read a persisted timestamp: epoch seconds, or an ISO string from older state files."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return float(value)
+
+
+@dataclass(**DATACLASS_SLOTS)
 class TrackedSession:
     """Represents a tracked Claude Code session."""
     session_id: str
@@ -30,9 +44,15 @@ class TrackedSession:
     original_bg_color: Optional[str] = None  # Original background color as AppleScript RGB "{r, g, b}"
     current_state: ClaudeState = ClaudeState.IDLE
     current_task: Optional[str] = None
-    last_updated: datetime = field(default_factory=datetime.now)
-    last_notification: Optional[datetime] = None
-    notification_cooldown_until: Optional[datetime] = None
+    # Timestamps are epoch seconds (time.time())
+    last_updated: float = field(default_factory=time.time)
+    # Notification bookkeeping (runtime only, not persisted)
+    last_notification: Optional[float] = None
+    notification_cooldown_until: Optional[float] = None
+    # Screen-scrape schedule kept by the daemon (runtime only, not persisted)
+    poll_interval: float = 0.0  # seconds
+    next_poll_at: float = 0.0   # time.monotonic() deadline
+    screen_hash: Optional[int] = None  # hash of the bottom screen lines at last poll
 
     def to_dict(self) -> dict:
         """Convert to dictionary for serialization."""
@@ -46,8 +66,7 @@ class TrackedSession:
             'original_bg_color': self.original_bg_color,
             'current_state': self.current_state.value,
             'current_task': self.current_task,
-            'last_updated': self.last_updated.isoformat(),
-            'last_notification': self.last_notification.isoformat() if self.last_notification else None,
+            'last_updated': self.last_updated,
         }
 
     @classmethod
@@ -63,8 +82,7 @@ class TrackedSession:
             original_bg_color=data.get('original_bg_color'),
             current_state=ClaudeState(data.get('current_state', 'idle')),
             current_task=data.get('current_task'),
-            last_updated=datetime.fromisoformat(data['last_updated']) if data.get('last_updated') else datetime.now(),
-            last_notification=datetime.fromisoformat(data['last_notification']) if data.get('last_notification') else None,
+            last_updated=_to_epoch(data.get('last_updated')) or time.time(),
         )
 
 
@@ -79,40 +97,63 @@ class SessionManager:
     """
 
     STATE_FILE = Path.home() / ".claude-hud" / "state.json"
+    SAVE_DELAY = 0.5  # seconds to coalesce state writes
 
     def __init__(self):
         """Initialize the session manager."""
         self.sessions: Dict[str, TrackedSession] = {}
+        # Kept in step with self.sessions so summaries don't rescan it
+        self._state_counts: Counter = Counter()  # ClaudeState -> number of sessions
+        self._window_index: Dict[Optional[str], Dict[str, TrackedSession]] = {}  # window_name -> sessions
+        self._writer = DebouncedJsonWriter(self.STATE_FILE, self._encode_state, self.SAVE_DELAY)
         self._load_state()
 
-    def _ensure_state_dir(self) -> None:
-        """Ensure the state directory exists."""
-        self.STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
-
     def _load_state(self) -> None:
         """Load persisted state from disk."""
         if self.STATE_FILE.exists():
             try:
-                with open(self.STATE_FILE, 'r') as f:
-                    data = json.load(f)
+                with open(self.STATE_FILE, 'rb') as f:
+                    data = json_loads(f.read())
                     for session_data in data.get('sessions', []):
                         session = TrackedSession.from_dict(session_data)
-                        self.sessions[session.iterm_session_id] = session
-            except (json.JSONDecodeError, IOError):
+                        self._add_session(session)
+            except (ValueError, IOError):
                 pass
 
-    def _save_state(self) -> None:
-        """Persist state to disk."""
-        self._ensure_state_dir()
-        data = {
+    def _add_session(self, session: TrackedSession) -> None:
+        """Store a session and add it to the state and window indexes."""
+        self._remove_session(session.iterm_session_id)
+        self.sessions[session.iterm_session_id] = session
+        self._state_counts[session.current_state] += 1
+        self._window_index.setdefault(session.window_name, {})[session.iterm_session_id] = session
+
+    def _remove_session(self, iterm_session_id: str) -> Optional[TrackedSession]:
+        """Remove a session and its index entries; returns it if it was tracked."""
+        session = self.sessions.pop(iterm_session_id, None)
+        if session is None:
+            return None
+        self._state_counts[session.current_state] -= 1
+        window_sessions = self._window_index.get(session.window_name)
+        if window_sessions is not None:
+            window_sessions.pop(iterm_session_id, None)
+            if not window_sessions:
+                del self._window_index[session.window_name]
+        return session
+
+    def _schedule_save(self) -> None:
+        """Coalesce state writes into one delayed save."""
+        self._writer.schedule()
+
+    def flush(self) -> None:
+        """Synchronously write any pending state changes (e.g. on shutdown)."""
+        self._writer.flush()
+
+    def _encode_state(self) -> bytes:
+        """Serialize the current state for the writer."""
+        return json_dumps({
             'sessions': [s.to_dict() for s in self.sessions.values()],
-            'last_updated': datetime.now().isoformat(),
-        }
-        try:
-            with open(self.STATE_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
-        except IOError:
-            pass
+            'last_updated': time.time(),
+        })
 
     def _get_next_color_index(self) -> int:
         """
@@ -163,8 +204,8 @@ class SessionManager:
             color_index=color_index,
         )
 
-        self.sessions[iterm_session_id] = session
-        self._save_state()
+        self._add_session(session)
+        self._schedule_save()
 
         return session
 
@@ -178,9 +219,8 @@ class SessionManager:
         Returns:
             True if session was found and removed, False otherwise.
         """
-        if iterm_session_id in self.sessions:
-            del self.sessions[iterm_session_id]
-            self._save_state()
+        if self._remove_session(iterm_session_id) is not None:
+            self._schedule_save()
             return True
         return False
 
@@ -201,20 +241,47 @@ class SessionManager:
         Returns:
             True if state changed, False otherwise.
         """
-        if iterm_session_id not in self.sessions:
-            return False
+        return bool(self.update_session_states({iterm_session_id: (state, task)}))
 
-        session = self.sessions[iterm_session_id]
-        state_changed = session.current_state != state
+    def update_session_states(
+        self,
+        updates: Dict[str, Tuple[ClaudeState, Optional[str]]],
+    ) -> List[str]:
+        """
+        Update the state of several tracked sessions at once.
+
+        Unknown session IDs are ignored. At most one save is scheduled for
+        the whole batch.
 
-        session.current_state = state
-        session.current_task = task
-        session.last_updated = datetime.now()
+        Args:
+            updates: Mapping of iTerm2 session ID to (state, task).
 
-        if state_changed:
-            self._save_state()
+        Returns:
+            The iTerm2 session IDs whose state changed.
+        """
+        sessions = self.sessions
+        counts = self._state_counts
+        now = time.time()
+        changed = []
+
+        for iterm_session_id, (state, task) in updates.items():
+            session = sessions.get(iterm_session_id)
+            if session is None:
+                continue
 
-        return state_changed
+            previous = session.current_state
+            if previous is not state:
+                counts[previous] -= 1
+                counts[state] += 1
+                session.current_state = state
+                changed.append(iterm_session_id)
+            session.current_task = task
+            session.last_updated = now
+
+        if changed:
+            self._schedule_save()
+
+        return changed
 
     def update_claude_session_id(
         self,
@@ -230,7 +297,7 @@ class SessionManager:
         """
         if iterm_session_id in self.sessions:
             self.sessions[iterm_session_id].session_id = claude_session_id
-            self._save_state()
+            self._schedule_save()
 
     def get_session(self, iterm_session_id: str) -> Optional[TrackedSession]:
         """
@@ -254,10 +321,7 @@ class SessionManager:
         Returns:
             List of sessions in that window.
         """
-        return [
-            s for s in self.sessions.values()
-            if s.window_name == window_name
-        ]
+        return list(self._window_index.get(window_name, {}).values())
 
     def get_all_sessions(self) -> List[TrackedSession]:
         """
@@ -275,38 +339,26 @@ class SessionManager:
         Returns:
             Dictionary with status summary.
         """
-        # Group sessions by window
-        windows: Dict[str, List[TrackedSession]] = {}
-
-        for session in self.sessions.values():
-            window_name = session.window_name or "Unnamed"
-            if window_name not in windows:
-                windows[window_name] = []
-            windows[window_name].append(session)
-
-        # Build summary
         summary = {
             'total_sessions': len(self.sessions),
             'windows': {},
-            'by_state': {state.value: 0 for state in ClaudeState},
+            'by_state': {state.value: self._state_counts[state] for state in ClaudeState},
         }
 
-        for window_name, sessions in windows.items():
-            window_summary = {
+        # Sessions are already grouped by window; unnamed ones share a group
+        for window_name, sessions in self._window_index.items():
+            window_summary = summary['windows'].setdefault(window_name or "Unnamed", {
                 'sessions': [],
                 'by_state': {state.value: 0 for state in ClaudeState},
-            }
+            })
 
-            for session in sessions:
+            for session in sessions.values():
                 window_summary['sessions'].append({
                     'project': session.project_name,
                     'state': session.current_state.value,
                     'task': session.current_task,
                 })
                 window_summary['by_state'][session.current_state.value] += 1
-                summary['by_state'][session.current_state.value] += 1
-
-            summary['windows'][window_name] = window_summary
 
         return summary
 
@@ -365,4 +417,4 @@ if __name__ == "__main__":
     # Show raw summary
     print("\nRaw Summary:")
     summary = manager.get_status_summary()
-    print(json.dumps(summary, indent=2))
+    print(json_dumps(summary, indent=True).decode('utf-8'))
@@ -10,15 +10,42 @@ import sys
 sys.dont_write_bytecode = True
 
 import asyncio
-import json
+import functools
+import logging
 import os
 import socket
+import time
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, Optional, Callable, Any, Awaitable
+from typing import Dict, Optional, Callable, Awaitable
 
+from hud_common import DebouncedJsonWriter, JSONDecodeError, json_dumps, json_loads
 from state_detector import ClaudeState
 
+logger = logging.getLogger("claude_hud")
+
+
+@functools.lru_cache(maxsize=256)
+def _cwd_key(cwd: str) -> str:
+    """
+    Canonical form of a working directory for matching.
+
+    Hooks and iTerm2 can report the same directory differently (symlinks,
+    trailing slashes, /var vs /private/var on macOS).
+    """
+    if not cwd.startswith('/'):
+        return cwd
+    return os.path.realpath(cwd)
+
+
+# Hook state strings -> ClaudeState
+_STATE_MAP = {
+    'idle': ClaudeState.IDLE,
+    'working': ClaudeState.WORKING,
+    'waiting': ClaudeState.WAITING_INPUT,
+    'done': ClaudeState.DONE,
+    'error': ClaudeState.ERROR,
+}
+
 
 class SessionMapper:
     """
@@ -31,86 +58,120 @@ class SessionMapper:
     """
 
     MAP_FILE = Path.home() / ".claude-hud" / "session-map.json"
+    SAVE_DELAY = 1.0  # seconds to coalesce mapping writes
 
     def __init__(self):
-        self._claude_sessions: Dict[str, dict] = {}  # claude_id -> {cwd, timestamp}
-        self._iterm_sessions: Dict[str, dict] = {}   # iterm_id -> {cwd, timestamp}
+        self._claude_sessions: Dict[str, dict] = {}  # claude_id -> {cwd, key, timestamp (epoch)}
+        self._iterm_sessions: Dict[str, dict] = {}   # iterm_id -> {cwd, key, timestamp (epoch)}
         self._mapping: Dict[str, str] = {}           # claude_id -> iterm_id
         self._reverse_mapping: Dict[str, str] = {}   # iterm_id -> claude_id
+        # cwd key -> ids, as insertion-ordered sets so the earliest registration wins
+        self._cwd_to_claude: Dict[str, Dict[str, None]] = {}
+        self._cwd_to_iterm: Dict[str, Dict[str, None]] = {}
+        self._writer = DebouncedJsonWriter(self.MAP_FILE, self._encode_mapping, self.SAVE_DELAY)
         self._load_mapping()
 
     def _load_mapping(self) -> None:
         """Load persisted mapping from disk."""
         if self.MAP_FILE.exists():
             try:
-                with open(self.MAP_FILE, 'r') as f:
-                    data = json.load(f)
+                with open(self.MAP_FILE, 'rb') as f:
+                    data = json_loads(f.read())
                     self._mapping = data.get('mapping', {})
                     self._reverse_mapping = {v: k for k, v in self._mapping.items()}
-            except (json.JSONDecodeError, IOError):
+            except (JSONDecodeError, IOError):
                 pass
 
-    def _save_mapping(self) -> None:
-        """Persist mapping to disk."""
-        self.MAP_FILE.parent.mkdir(parents=True, exist_ok=True)
-        try:
-            with open(self.MAP_FILE, 'w') as f:
-                json.dump({
-                    'mapping': self._mapping,
-                    'updated': datetime.now().isoformat()
-                }, f, indent=2)
-        except IOError:
-            pass
+    def _schedule_save(self) -> None:
+        """Coalesce mapping writes into one delayed save."""
+        self._writer.schedule()
+
+    def flush(self) -> None:
+        """Synchronously write any pending mapping changes (e.g. on shutdown)."""
+        self._writer.flush()
+
+    def _encode_mapping(self) -> bytes:
+        """Serialize the mapping for the writer."""
+        return json_dumps({
+            'mapping': self._mapping,
+            'updated_epoch': time.time(),
+        })
+
+    @staticmethod
+    def _index_add(index: Dict[str, Dict[str, None]], cwd: str, session_id: str) -> None:
+        """Add a session id under its cwd in a cwd index."""
+        index.setdefault(cwd, {})[session_id] = None
+
+    @staticmethod
+    def _index_discard(index: Dict[str, Dict[str, None]], cwd: str, session_id: str) -> None:
+        """Remove a session id from a cwd index, dropping empty buckets."""
+        ids = index.get(cwd)
+        if ids is not None:
+            ids.pop(session_id, None)
+            if not ids:
+                del index[cwd]
 
     def register_claude_session(self, claude_id: str, cwd: str) -> Optional[str]:
         """
         Register a Claude session from hook.
         Returns matched iTerm session_id if found.
         """
-        now = datetime.now()
+        key = _cwd_key(cwd)
+        previous = self._claude_sessions.get(claude_id)
+        if previous is not None and previous['key'] != key:
+            self._index_discard(self._cwd_to_claude, previous['key'], claude_id)
+
         self._claude_sessions[claude_id] = {
             'cwd': cwd,
-            'timestamp': now.isoformat()
+            'key': key,
+            'timestamp': time.time()
         }
+        self._index_add(self._cwd_to_claude, key, claude_id)
 
         # Try to match with existing iTerm session
-        return self._try_match_by_cwd(claude_id, cwd)
+        return self._try_match_by_cwd(claude_id, key)
 
     def register_iterm_session(self, iterm_id: str, cwd: str) -> Optional[str]:
         """
         Register an iTerm2 session from daemon.
         Returns matched Claude session_id if found.
         """
-        now = datetime.now()
+        key = _cwd_key(cwd)
+        previous = self._iterm_sessions.get(iterm_id)
+        if previous is not None and previous['key'] != key:
+            self._index_discard(self._cwd_to_iterm, previous['key'], iterm_id)
+
         self._iterm_sessions[iterm_id] = {
             'cwd': cwd,
-            'timestamp': now.isoformat()
+            'key': key,
+            'timestamp': time.time()
         }
+        self._index_add(self._cwd_to_iterm, key, iterm_id)
 
-        # Try to match with existing Claude sessions
-        for claude_id, info in self._claude_sessions.items():
-            if info['cwd'] == cwd and claude_id not in self._mapping:
+        # Try to match with existing Claude sessions in the same cwd
+        for claude_id in self._cwd_to_claude.get(key, ()):
+            if claude_id not in self._mapping:
                 self._mapping[claude_id] = iterm_id
                 self._reverse_mapping[iterm_id] = claude_id
-                self._save_mapping()
-                print(f"[SessionMapper] Matched: {claude_id[:8]}... -> {iterm_id}")
+                self._schedule_save()
+                logger.info("[SessionMapper] Matched: %s... -> %s", claude_id[:8], iterm_id)
                 return claude_id
 
         return None
 
-    def _try_match_by_cwd(self, claude_id: str, cwd: str) -> Optional[str]:
-        """Try to match Claude session with iTerm session by cwd."""
+    def _try_match_by_cwd(self, claude_id: str, key: str) -> Optional[str]:
+        """Try to match Claude session with iTerm session by canonical cwd."""
         # Already mapped?
         if claude_id in self._mapping:
             return self._mapping[claude_id]
 
         # Find iTerm session with matching cwd that isn't already mapped
-        for iterm_id, info in self._iterm_sessions.items():
-            if info['cwd'] == cwd and iterm_id not in self._reverse_mapping:
+        for iterm_id in self._cwd_to_iterm.get(key, ()):
+            if iterm_id not in self._reverse_mapping:
                 self._mapping[claude_id] = iterm_id
                 self._reverse_mapping[iterm_id] = claude_id
-                self._save_mapping()
-                print(f"[SessionMapper] Matched: {claude_id[:8]}... -> {iterm_id}")
+                self._schedule_save()
+                logger.info("[SessionMapper] Matched: %s... -> %s", claude_id[:8], iterm_id)
                 return iterm_id
 
         return None
@@ -126,16 +187,23 @@ class SessionMapper:
     def unregister_iterm_session(self, iterm_id: str) -> None:
         """Remove an iTerm session from tracking."""
         if iterm_id in self._iterm_sessions:
-            del self._iterm_sessions[iterm_id]
+            info = self._iterm_sessions.pop(iterm_id)
+            self._index_discard(self._cwd_to_iterm, info['key'], iterm_id)
 
+        # Only the persisted mapping needs saving; most closed panes never had one
+        changed = False
         if iterm_id in self._reverse_mapping:
             claude_id = self._reverse_mapping[iterm_id]
             del self._reverse_mapping[iterm_id]
             if claude_id in self._mapping:
                 del self._mapping[claude_id]
+                changed = True
             if claude_id in self._claude_sessions:
-                del self._claude_sessions[claude_id]
-            self._save_mapping()
+                info = self._claude_sessions.pop(claude_id)
+                self._index_discard(self._cwd_to_claude, info['key'], claude_id)
+
+        if changed:
+            self._schedule_save()
 
 
 class SocketListener:
@@ -150,19 +218,30 @@ class SocketListener:
     def __init__(
         self,
         session_mapper: SessionMapper,
-        on_state_update: Callable[[str, ClaudeState, str], Awaitable[None]]
+        on_state_update: Callable[[str, ClaudeState, str], Awaitable[bool]]
     ):
         """
         Initialize the socket listener.
 
         Args:
             session_mapper: SessionMapper instance for claude->iterm mapping
-            on_state_update: Async callback (iterm_session_id, state, cwd) for updates
+            on_state_update: Async callback (iterm_session_id, state, cwd) for
+                updates; returns False if the session wasn't ready for it
         """
         self.session_mapper = session_mapper
         self.on_state_update = on_state_update
+        self._last_state: Dict[str, ClaudeState] = {}  # iterm_id -> last hook state
+        self._last_seen: Dict[str, float] = {}  # iterm_id -> time.monotonic() of last hook
+        self._socket_path = str(self.SOCKET_PATH)
         self._socket: Optional[socket.socket] = None
+        # Reused receive buffer; each datagram is copied out at its real size
+        self._recv_buf = bytearray(self.BUFFER_SIZE)
+        self._recv_view = memoryview(self._recv_buf)
         self._running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        # Bursts waiting to be handled; one consumer keeps them in arrival order
+        self._batches: Optional[asyncio.Queue] = None
 
     def _setup_socket(self) -> None:
         """Create and bind the Unix domain socket."""
@@ -170,105 +249,168 @@ class SocketListener:
         self.SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
 
         # Remove existing socket file
-        if self.SOCKET_PATH.exists():
-            self.SOCKET_PATH.unlink()
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
 
         # Create datagram socket
         self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
         self._socket.setblocking(False)
-        self._socket.bind(str(self.SOCKET_PATH))
+        self._socket.bind(self._socket_path)
 
         # Set permissions (owner read/write only)
-        os.chmod(str(self.SOCKET_PATH), 0o600)
+        os.chmod(self._socket_path, 0o600)
 
-        print(f"[SocketListener] Bound to {self.SOCKET_PATH}")
+        # Let the event loop's selector wake us only when a datagram is queued
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._socket.fileno(), self._on_readable)
+
+        logger.info("[SocketListener] Bound to %s", self._socket_path)
 
     def _cleanup_socket(self) -> None:
         """Clean up the socket."""
         if self._socket:
+            # Unregister before closing so the selector never sees a dead fd
+            if self._loop:
+                self._loop.remove_reader(self._socket.fileno())
+                self._loop = None
             try:
                 self._socket.close()
             except Exception:
                 pass
+            self._socket = None
 
-        if self.SOCKET_PATH.exists():
+        if os.path.exists(self._socket_path):
             try:
-                self.SOCKET_PATH.unlink()
+                os.unlink(self._socket_path)
             except Exception:
                 pass
 
     async def start(self) -> None:
         """Start listening for messages."""
+        self._batches = asyncio.Queue()
         self._setup_socket()
         self._running = True
-
-        while self._running:
+        self._stopped = asyncio.Event()
+        consumer = asyncio.create_task(self._process_batches())
+        try:
+            await self._stopped.wait()
+        finally:
+            consumer.cancel()
+
+    def _on_readable(self) -> None:
+        """Drain all queued datagrams and dispatch them as one batch."""
+        batch = []
+        while True:
             try:
-                # Non-blocking receive
-                try:
-                    data, _ = self._socket.recvfrom(self.BUFFER_SIZE)
-                    if data:
-                        await self._handle_message(data)
-                except BlockingIOError:
-                    # No data available
-                    pass
-                except socket.error:
-                    pass
-
-                # Small sleep to prevent busy-waiting
-                await asyncio.sleep(0.01)
-
-            except Exception as e:
-                print(f"[SocketListener] Error: {e}")
-                await asyncio.sleep(0.1)
+                nbytes, _ = self._socket.recvfrom_into(self._recv_buf)
+            except BlockingIOError:
+                # Socket drained
+                break
+            except socket.error as e:
+                logger.warning("[SocketListener] Error: %s", e)
+                break
+
+            if nbytes:
+                batch.append(bytes(self._recv_view[:nbytes]))
+
+        if batch:
+            self._batches.put_nowait(batch)
+
+    async def _process_batches(self) -> None:
+        """
+        Handle queued bursts one at a time.
+
+        Handling a message awaits iTerm2, so bursts handled concurrently
+        could finish out of order and leave a session on a stale state.
+        """
+        while True:
+            batch = await self._batches.get()
+            for data in batch:
+                await self._handle_message(data)
 
     async def _handle_message(self, data: bytes) -> None:
         """Process a received message."""
+        # Cheap byte scan to skip other message types without parsing them
+        if b'"state_update"' not in data:
+            return
+
         try:
-            message = json.loads(data.decode('utf-8'))
+            message = json_loads(data)
+            get = message.get
 
-            msg_type = message.get('type')
-            if msg_type != 'state_update':
+            if get('type') != 'state_update':
                 return
 
-            claude_session_id = message.get('session_id')
-            cwd = message.get('cwd', '')
-            state_str = message.get('state', 'idle')
-            hook_event = message.get('hook_event', '')
-
+            claude_session_id = get('session_id')
             if not claude_session_id:
                 return
 
-            # Map state string to enum
-            state_map = {
-                'idle': ClaudeState.IDLE,
-                'working': ClaudeState.WORKING,
-                'waiting': ClaudeState.WAITING_INPUT,
-                'done': ClaudeState.DONE,
-                'error': ClaudeState.ERROR
-            }
-            state = state_map.get(state_str, ClaudeState.IDLE)
+            cwd = get('cwd', '')
+            state_str = get('state', 'idle')
 
-            # Register Claude session (helps with mapping)
-            self.session_mapper.register_claude_session(claude_session_id, cwd)
+            # Map state string to enum
+            state = _STATE_MAP.get(state_str, ClaudeState.IDLE)
 
-            # Get iTerm session ID
-            iterm_session_id = self.session_mapper.get_iterm_session(claude_session_id)
+            # Get iTerm session ID; steady-state messages are already mapped
+            session_mapper = self.session_mapper
+            iterm_session_id = session_mapper.get_iterm_session(claude_session_id)
+            if iterm_session_id is None:
+                # Register Claude session (helps with mapping)
+                iterm_session_id = session_mapper.register_claude_session(claude_session_id, cwd)
 
             if iterm_session_id:
+                self._last_seen[iterm_session_id] = time.monotonic()
+
+                # Claude repeats the same state many times during long tool
+                # calls; only forward transitions
+                if self._last_state.get(iterm_session_id) is state:
+                    return
+
                 # Trigger visual update
-                print(f"[Hook] {hook_event}: {state_str} (cwd: {Path(cwd).name})")
-                await self.on_state_update(iterm_session_id, state, cwd)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "[Hook] %s: %s (cwd: %s)",
+                        get('hook_event', ''), state_str, cwd.rsplit('/', 1)[-1],
+                    )
+                if await self.on_state_update(iterm_session_id, state, cwd):
+                    # Remember only applied states, so a repeat still gets
+                    # through if the session wasn't tracked yet
+                    self._last_state[iterm_session_id] = state
             else:
                 # No mapping yet - will be matched when daemon detects iTerm session
-                print(f"[Hook] No iTerm mapping for Claude session {claude_session_id[:8]}... (cwd: {cwd})")
+                logger.debug("[Hook] No iTerm mapping for Claude session %s... (cwd: %s)", claude_session_id[:8], cwd)
 
-        except json.JSONDecodeError:
-            print(f"[SocketListener] Invalid JSON: {data[:100]}")
+        except JSONDecodeError:
+            logger.warning("[SocketListener] Invalid JSON: %r", data[:100])
         except Exception as e:
-            print(f"[SocketListener] Error handling message: {e}")
+            logger.exception("[SocketListener] Error handling message: %s", e)
+
+    def forget_session(self, iterm_session_id: str) -> None:
+        """
+        Drop the remembered hook state for a session.
+
+        Call this when the session's state changed through another path
+        (e.g. screen scraping) or the session closed, so the next hook
+        message is forwarded even if it repeats the last hook state.
+        """
+        self._last_state.pop(iterm_session_id, None)
+        self._last_seen.pop(iterm_session_id, None)
+
+    def last_seen(self, iterm_session_id: str) -> float:
+        """
+        Get when a hook last reported on a session.
+
+        Repeated states count too, even though they are not forwarded.
+
+        Returns:
+            The time.monotonic() timestamp of the last hook message, or 0.0.
+        """
+        return self._last_seen.get(iterm_session_id, 0.0)
 
     def stop(self) -> None:
         """Stop the listener and clean up."""
         self._running = False
         self._cleanup_socket()
+        self.session_mapper.flush()
+        if self._stopped:
+            self._stopped.set()
@@ -15,11 +15,15 @@ sys.dont_write_bytecode = True
 
 import os
 import re
+import time
+from collections import deque
 from pathlib import Path
 from enum import Enum
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, List, Tuple
+from typing import Deque, Optional, List, Tuple
+
+from hud_common import DATACLASS_SLOTS
 
 
 class ClaudeState(Enum):
@@ -30,7 +34,7 @@ class ClaudeState(Enum):
     ERROR = "error"
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class StateInfo:
     """Information about the current state of a Claude Code session."""
     state: ClaudeState
@@ -47,21 +51,31 @@ class ClaudeStateDetector:
     DEBUG_DIR = CLAUDE_DIR / "debug"
     TODOS_DIR = CLAUDE_DIR / "todos"
 
-    # Patterns to detect in debug logs
+    # Bytes read from the end of a debug log for recent entries; doubled
+    # while too few lines fit, up to TAIL_MAX_BYTES. read_new_entries also
+    # skips to the last TAIL_CHUNK_BYTES when more than TAIL_MAX_BYTES is new.
+    TAIL_CHUNK_BYTES = 64 * 1024
+    TAIL_MAX_BYTES = 1024 * 1024
+    RECENT_LINES = 100  # lines kept in the rolling window analyzed by get_state
+    DEBUG_FILE_TTL = 5.0  # seconds find_debug_file reuses its last answer
+
+    # Patterns to detect in debug logs. These are plain literals, not
+    # regexes: _compile_patterns lowercases and escapes them, since
+    # lowercasing regex source would change escapes like \S or \W.
     PATTERNS = {
         'working': [
-            r'Stream started',
-            r'executePreToolHooks',
-            r'\[API:request\]',
-            r'Executing tool',
+            'Stream started',
+            'executePreToolHooks',
+            '[API:request]',
+            'Executing tool',
         ],
         'waiting': [
-            r'permission_prompt',
-            r'GetInput',
+            'permission_prompt',
+            'GetInput',
         ],
         'error': [
-            r'\[ERROR\]',
-            r'Error:',
+            '[ERROR]',
+            'Error:',
         ],
         'done': [
             r'Stream completed',
@@ -69,7 +83,9 @@ class ClaudeStateDetector:
         ],
     }
 
-    # Compiled regex patterns for efficiency
+    # Compiled regex patterns for efficiency. They are lowercased and matched
+    # against lowercased text: re.IGNORECASE (or one big alternation) loses
+    # re's fast literal search and is several times slower.
     _compiled_patterns: dict = {}
 
     def __init__(self, session_id: Optional[str] = None):
@@ -82,6 +98,11 @@ class ClaudeStateDetector:
         """
         self.session_id = session_id
         self._last_file_position = 0
+        # Rolling window of the newest lines of _recent_file, fed incrementally
+        self._recent_entries: Deque[str] = deque(maxlen=self.RECENT_LINES)
+        self._recent_file: Optional[Path] = None
+        # (path, time.monotonic() found) from the last find_debug_file
+        self._debug_file_cache: Optional[Tuple[Path, float]] = None
         self._last_state = ClaudeState.IDLE
         self._last_activity_time: Optional[datetime] = None
         self._compile_patterns()
@@ -91,19 +112,29 @@ class ClaudeStateDetector:
         if not self._compiled_patterns:
             for state, patterns in self.PATTERNS.items():
                 self._compiled_patterns[state] = [
-                    re.compile(p, re.IGNORECASE) for p in patterns
+                    re.compile(re.escape(p.lower())) for p in patterns
                 ]
 
     def find_debug_file(self) -> Optional[Path]:
         """
         Find the debug log file for this session.
 
+        The answer is reused for DEBUG_FILE_TTL seconds, so repeated calls
+        don't re-scan the debug directory.
+
         Returns:
             Path to the debug log file, or None if not found.
         """
-        if not self.DEBUG_DIR.exists():
-            return None
+        cached = self._debug_file_cache
+        if cached and time.monotonic() - cached[1] < self.DEBUG_FILE_TTL:
+            return cached[0]
 
+        debug_file = self._find_debug_file()
+        self._debug_file_cache = (debug_file, time.monotonic()) if debug_file else None
+        return debug_file
+
+    def _find_debug_file(self) -> Optional[Path]:
+        """Look up the debug log file on disk (uncached find_debug_file)."""
         # If we have a session ID, look for that specific file
         if self.session_id:
             debug_file = self.DEBUG_DIR / f"{self.session_id}.txt"
@@ -111,13 +142,36 @@ class ClaudeStateDetector:
                 return debug_file
 
         # Otherwise, find the most recently modified debug file
-        debug_files = list(self.DEBUG_DIR.glob("*.txt"))
+        debug_files = self._scan_debug_files()
         if not debug_files:
             return None
 
-        # Sort by modification time, most recent first
-        debug_files.sort(key=lambda f: f.stat().st_mtime, reverse=True)
-        return debug_files[0]
+        newest_path, _ = max(debug_files, key=lambda item: item[1])
+        return Path(newest_path)
+
+    def _scan_debug_files(self) -> List[Tuple[str, float]]:
+        """
+        List the debug log files in one directory pass.
+
+        Returns:
+            List of (path, mtime) tuples; empty if the directory is missing.
+        """
+        debug_files = []
+        try:
+            with os.scandir(self.DEBUG_DIR) as entries:
+                for entry in entries:
+                    # Same files as glob("*.txt"), which skips dotfiles
+                    name = entry.name
+                    if not name.endswith('.txt') or name.startswith('.'):
+                        continue
+                    try:
+                        debug_files.append((entry.path, entry.stat().st_mtime))
+                    except OSError:
+                        # Removed between listing and stat
+                        continue
+        except OSError:
+            return []
+        return debug_files
 
     def find_active_sessions(self) -> List[Tuple[str, Path]]:
         """
@@ -126,18 +180,14 @@ class ClaudeStateDetector:
         Returns:
             List of (session_id, debug_file_path) tuples for active sessions.
         """
-        if not self.DEBUG_DIR.exists():
-            return []
-
         active_sessions = []
-        now = datetime.now()
+        # Consider a session active if modified in the last 5 minutes
+        cutoff = time.time() - 5 * 60
 
-        for debug_file in self.DEBUG_DIR.glob("*.txt"):
-            # Consider a session active if modified in the last 5 minutes
-            mtime = datetime.fromtimestamp(debug_file.stat().st_mtime)
-            if now - mtime < timedelta(minutes=5):
-                session_id = debug_file.stem
-                active_sessions.append((session_id, debug_file))
+        for path, mtime in self._scan_debug_files():
+            if mtime > cutoff:
+                debug_file = Path(path)
+                active_sessions.append((debug_file.stem, debug_file))
 
         return active_sessions
 
@@ -153,36 +203,71 @@ class ClaudeStateDetector:
             List of recent log entries.
         """
         try:
-            with open(debug_file, 'r', encoding='utf-8', errors='ignore') as f:
-                # Read all lines and get the last max_lines
-                lines = f.readlines()
-                return lines[-max_lines:] if len(lines) > max_lines else lines
+            with open(debug_file, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                window = self.TAIL_CHUNK_BYTES
+                while True:
+                    # Read only the tail instead of the whole (possibly huge) log
+                    start = max(0, size - window)
+                    f.seek(start)
+                    lines = f.read().decode('utf-8', errors='ignore').splitlines()
+                    if start > 0:
+                        # The first line is probably cut off by the seek
+                        lines = lines[1:]
+                    if len(lines) >= max_lines or start == 0 or window >= self.TAIL_MAX_BYTES:
+                        return lines[-max_lines:]
+                    window *= 2
         except (IOError, OSError):
             return []
 
-    def read_new_entries(self, debug_file: Path) -> List[str]:
+    def read_new_entries(self, debug_file: Path, file_size: Optional[int] = None) -> List[str]:
         """
         Read only new entries since last check.
 
+        A trailing line that is still being written is held back until
+        its newline arrives.
+
         Args:
             debug_file: Path to the debug log file.
+            file_size: Current size of the file, if the caller already
+                       stat'ed it.
 
         Returns:
             List of new log entries since last read.
         """
         try:
-            file_size = debug_file.stat().st_size
+            if file_size is None:
+                file_size = debug_file.stat().st_size
 
-            # If file was truncated or is new, start from beginning
-            if file_size < self._last_file_position:
-                self._last_file_position = 0
+            position = self._last_file_position
+            if file_size == position:
+                return []
 
-            with open(debug_file, 'r', encoding='utf-8', errors='ignore') as f:
-                f.seek(self._last_file_position)
+            # If file was truncated or is new, start from beginning
+            if file_size < position:
+                position = 0
+                self._recent_entries.clear()
+
+            # After a long gap only the end of the backlog matters
+            skip_partial = file_size - position > self.TAIL_MAX_BYTES
+            if skip_partial:
+                # One byte early, so a seek onto a line start loses nothing
+                position = file_size - self.TAIL_CHUNK_BYTES - 1
+                self._recent_entries.clear()
+
+            with open(debug_file, 'rb') as f:
+                f.seek(position)
                 new_content = f.read()
-                self._last_file_position = f.tell()
 
-            return new_content.splitlines() if new_content else []
+            if skip_partial:
+                # Drop the line the seek landed in the middle of
+                start = new_content.find(b'\n') + 1
+                position += start
+                new_content = new_content[start:]
+
+            complete = new_content.rfind(b'\n') + 1
+            self._last_file_position = position + complete
+            return new_content[:complete].decode('utf-8', errors='ignore').splitlines()
         except (IOError, OSError):
             return []
 
@@ -205,6 +290,26 @@ class ClaudeStateDetector:
                 pass
         return None
 
+    def _first_match(self, text: str, state: str, endpos: int) -> int:
+        """
+        Find the earliest match of any pattern for a state.
+
+        Args:
+            text: Lowercased, newline-joined entries.
+            state: Key into PATTERNS.
+            endpos: Only matches that start before this offset count.
+
+        Returns:
+            Offset of the earliest match, or -1 if none match.
+        """
+        first = endpos
+        for pattern in self._compiled_patterns.get(state, []):
+            # Only a match before the best so far can improve it
+            match = pattern.search(text, 0, first)
+            if match:
+                first = match.start()
+        return -1 if first == endpos else first
+
     def analyze_entries(self, entries: List[str]) -> ClaudeState:
         """
         Analyze log entries to determine the current state.
@@ -219,51 +324,33 @@ class ClaudeStateDetector:
             return ClaudeState.IDLE
 
         # Check entries from most recent to oldest
-        reversed_entries = list(reversed(entries))
-        recent_text = '\n'.join(reversed_entries[:50])
+        recent_text = '\n'.join(reversed(entries[-50:])).lower()
 
         # Check for error state first (highest priority)
         for pattern in self._compiled_patterns.get('error', []):
             if pattern.search(recent_text):
                 return ClaudeState.ERROR
 
-        # Track when we last saw each type of pattern
-        waiting_index = -1
-        working_index = -1
-        done_index = -1
-
-        for i, line in enumerate(reversed_entries[:50]):
-            # Check for waiting patterns
-            for pattern in self._compiled_patterns.get('waiting', []):
-                if pattern.search(line) and waiting_index == -1:
-                    waiting_index = i
-
-            # Check for working patterns
-            for pattern in self._compiled_patterns.get('working', []):
-                if pattern.search(line) and working_index == -1:
-                    working_index = i
-
-            # Check for done patterns
-            for pattern in self._compiled_patterns.get('done', []):
-                if pattern.search(line) and done_index == -1:
-                    done_index = i
-
-        # Determine state based on which pattern appeared most recently
-        # (lower index = more recent)
+        # Find the most recent working line first. Waiting and done only
+        # win if they appear on a more recent line, so their searches stop
+        # at the start of that line instead of scanning the whole window.
+        working_pos = self._first_match(recent_text, 'working', len(recent_text))
+        if working_pos == -1:
+            newer_end = len(recent_text)
+        else:
+            newer_end = recent_text.rfind('\n', 0, working_pos) + 1
 
         # If waiting is most recent, we're waiting for input
-        if waiting_index != -1:
-            if working_index == -1 or waiting_index < working_index:
-                return ClaudeState.WAITING_INPUT
+        if self._first_match(recent_text, 'waiting', newer_end) != -1:
+            return ClaudeState.WAITING_INPUT
 
         # If done is most recent and no activity after, we're done
-        if done_index != -1:
-            if (working_index == -1 or done_index < working_index) and \
-               (waiting_index == -1 or done_index < waiting_index):
-                return ClaudeState.DONE
+        # (waiting was ruled out on every line before working)
+        if self._first_match(recent_text, 'done', newer_end) != -1:
+            return ClaudeState.DONE
 
-        # If we saw working patterns recently, we're working
-        if working_index != -1 and working_index < 10:
+        # If we saw working patterns recently (within 10 lines), we're working
+        if working_pos != -1 and recent_text.count('\n', 0, working_pos) < 10:
             return ClaudeState.WORKING
 
         # Check file modification time for activity
@@ -281,13 +368,21 @@ class ClaudeStateDetector:
         if not debug_file:
             return StateInfo(state=ClaudeState.IDLE)
 
+        # One stat per call: mtime for activity, size for the incremental read
+        try:
+            stat = debug_file.stat()
+        except OSError:
+            # Removed since it was cached; look again next time
+            self._debug_file_cache = None
+            return StateInfo(state=ClaudeState.IDLE)
+
         # Check if file was recently modified
-        mtime = datetime.fromtimestamp(debug_file.stat().st_mtime)
+        mtime = datetime.fromtimestamp(stat.st_mtime)
         now = datetime.now()
 
         # If no activity in last 30 seconds, consider it done/idle
         if now - mtime > timedelta(seconds=30):
-            if self._last_state == ClaudeState.WORKING:
+            if self._last_state is ClaudeState.WORKING:
                 return StateInfo(
                     state=ClaudeState.DONE,
                     last_activity=mtime
@@ -297,9 +392,13 @@ class ClaudeStateDetector:
                 last_activity=mtime
             )
 
-        # Read and analyze recent entries
-        entries = self.read_recent_entries(debug_file)
-        state = self.analyze_entries(entries)
+        # Read only what was appended since the last call
+        if debug_file != self._recent_file:
+            self._recent_file = debug_file
+            self._recent_entries.clear()
+            self._last_file_position = 0
+        self._recent_entries.extend(self.read_new_entries(debug_file, stat.st_size))
+        state = self.analyze_entries(list(self._recent_entries))
 
         self._last_state = state
         self._last_activity_time = mtime
@@ -344,7 +443,7 @@ def get_project_name_from_path(project_path: str) -> str:
 # CLI for testing
 if __name__ == "__main__":
     import sys
-    import time
+    import threading
 
     detector = ClaudeStateDetector()
 
@@ -370,9 +469,37 @@ if __name__ == "__main__":
         print("\n\nWatching for state changes (Ctrl+C to stop)...")
         last_state = None
 
-        while True:
-            state_info = detector.get_state()
-            if state_info.state != last_state:
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] State: {state_info.state.value}")
-                last_state = state_info.state
-            time.sleep(0.5)
+        # With watchdog installed, re-check only when a debug log changes;
+        # the timeout still lets the 30s inactivity rule in get_state fire.
+        # Without it, fall back to polling every 0.5s.
+        log_changed = threading.Event()
+        observer = None
+        wait_timeout = 0.5
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            pass
+        else:
+            if detector.DEBUG_DIR.is_dir():
+                class DebugLogHandler(FileSystemEventHandler):
+                    def on_any_event(self, event):
+                        log_changed.set()
+
+                observer = Observer()
+                observer.schedule(DebugLogHandler(), str(detector.DEBUG_DIR))
+                observer.start()
+                wait_timeout = 5.0
+
+        try:
+            while True:
+                log_changed.clear()
+                state_info = detector.get_state()
+                if state_info.state != last_state:
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] State: {state_info.state.value}")
+                    last_state = state_info.state
+                log_changed.wait(wait_timeout)
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
@@ -9,19 +9,22 @@ Maps window names to iTerm2 window IDs for targeting new sessions.
 import sys
 sys.dont_write_bytecode = True
 
-import json
+import functools
+import time
 from pathlib import Path
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, KeysView, List, Optional, ValuesView
 
+from hud_common import DATACLASS_SLOTS, DebouncedJsonWriter, json_dumps, json_loads
 
-@dataclass
+
+@dataclass(**DATACLASS_SLOTS)
 class TrackedWindow:
     """Represents a tracked iTerm2 window."""
     name: str
     iterm_window_id: str
-    created_at: datetime
+    created_at: float  # epoch seconds (time.time())
     session_count: int = 0
 
     def to_dict(self) -> dict:
@@ -29,21 +32,32 @@ class TrackedWindow:
         return {
             'name': self.name,
             'iterm_window_id': self.iterm_window_id,
-            'created_at': self.created_at.isoformat(),
+            'created_at': self.created_at,
             'session_count': self.session_count,
         }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'TrackedWindow':
         """Create from dictionary."""
+        created_at = data['created_at']
+        if isinstance(created_at, str):
+            # Files written before timestamps were stored as epoch seconds
+            created_at = datetime.fromisoformat(created_at).timestamp()
         return cls(
             name=data['name'],
             iterm_window_id=data['iterm_window_id'],
-            created_at=datetime.fromisoformat(data['created_at']),
+            created_at=created_at,
             session_count=data.get('session_count', 0),
         )
 
 
+def _encode_window(o: Any) -> Any:
+    """JSON default hook: encode TrackedWindow as it is reached, without a to_dict() pass up front."""
+    if isinstance(o, TrackedWindow):
+        return o.to_dict()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
 class WindowManager:
     """
     Manages tracking of named iTerm2 windows.
@@ -56,43 +70,75 @@ class WindowManager:
     """
 
     STATE_FILE = Path.home() / ".claude-hud" / "windows.json"
+    SAVE_DELAY = 0.5  # seconds to coalesce state writes
 
     def __init__(self):
         """Initialize the window manager."""
         self.windows: Dict[str, TrackedWindow] = {}
+        # Kept in step with self.windows so ID lookups don't rescan it
+        self._by_iterm_id: Dict[str, Dict[str, TrackedWindow]] = {}  # iterm_window_id -> windows
         self._last_used_window: Optional[str] = None
+        self._newest: Optional[str] = None  # name of the most recently created window
+        self._writer = DebouncedJsonWriter(self.STATE_FILE, self._encode_state, self.SAVE_DELAY)
         self._load_state()
 
-    def _ensure_state_dir(self) -> None:
-        """Ensure the state directory exists."""
-        self.STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
-
     def _load_state(self) -> None:
         """Load persisted state from disk."""
-        if self.STATE_FILE.exists():
-            try:
-                with open(self.STATE_FILE, 'r') as f:
-                    data = json.load(f)
-                    for window_data in data.get('windows', []):
-                        window = TrackedWindow.from_dict(window_data)
-                        self.windows[window.name] = window
-                    self._last_used_window = data.get('last_used_window')
-            except (json.JSONDecodeError, IOError):
-                pass
-
-    def _save_state(self) -> None:
-        """Persist state to disk."""
-        self._ensure_state_dir()
-        data = {
-            'windows': [w.to_dict() for w in self.windows.values()],
-            'last_used_window': self._last_used_window,
-            'last_updated': datetime.now().isoformat(),
-        }
         try:
-            with open(self.STATE_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
-        except IOError:
-            pass
+            payload = self.STATE_FILE.read_bytes()
+            data = json_loads(payload)
+        except (ValueError, IOError):
+            # No state file yet, or an unreadable one
+            return
+
+        for window_data in data.get('windows', []):
+            self._add_window(TrackedWindow.from_dict(window_data))
+        self._last_used_window = data.get('last_used_window')
+        self._writer.mark_written(payload)
+
+    def _add_window(self, window: TrackedWindow) -> None:
+        """Store a window and add it to the iTerm2 window ID index."""
+        self._remove_window(window.name)
+        self.windows[window.name] = window
+        self._by_iterm_id.setdefault(window.iterm_window_id, {})[window.name] = window
+        newest = self.windows.get(self._newest)
+        if newest is None or window.created_at > newest.created_at:
+            self._newest = window.name
+
+    def _remove_window(self, name: str) -> Optional[TrackedWindow]:
+        """Remove a window and its index entry; returns it if it was tracked."""
+        window = self.windows.pop(name, None)
+        if window is None:
+            return None
+        id_windows = self._by_iterm_id.get(window.iterm_window_id)
+        if id_windows is not None:
+            id_windows.pop(name, None)
+            if not id_windows:
+                del self._by_iterm_id[window.iterm_window_id]
+        if name == self._newest:
+            # Rare (the newest window went away), so a rescan is fine here
+            self._newest = max(self.windows, key=lambda n: self.windows[n].created_at, default=None)
+        return window
+
+    def _schedule_save(self) -> None:
+        """Coalesce state writes into one delayed save."""
+        self._writer.schedule()
+
+    def flush(self) -> None:
+        """Synchronously write any pending state changes (e.g. on shutdown)."""
+        self._writer.flush()
+
+    def _encode_state(self) -> bytes:
+        """
+        Serialize the current state for the writer.
+
+        There is no timestamp in the payload, so an unchanged state encodes
+        to identical bytes and the writer skips the save.
+        """
+        return json_dumps({
+            'windows': list(self.windows.values()),
+            'last_used_window': self._last_used_window,
+        }, indent=True, default=_encode_window)
 
     def register_window(
         self,
@@ -112,12 +158,12 @@ class WindowManager:
         window = TrackedWindow(
             name=name,
             iterm_window_id=iterm_window_id,
-            created_at=datetime.now(),
+            created_at=time.time(),
         )
 
-        self.windows[name] = window
+        self._add_window(window)
         self._last_used_window = name
-        self._save_state()
+        self._schedule_save()
 
         return window
 
@@ -131,11 +177,10 @@ class WindowManager:
         Returns:
             True if window was found and removed, False otherwise.
         """
-        if name in self.windows:
-            del self.windows[name]
+        if self._remove_window(name) is not None:
             if self._last_used_window == name:
                 self._last_used_window = None
-            self._save_state()
+            self._schedule_save()
             return True
         return False
 
@@ -161,9 +206,9 @@ class WindowManager:
         Returns:
             The tracked window, or None if not found.
         """
-        for window in self.windows.values():
-            if window.iterm_window_id == iterm_window_id:
-                return window
+        id_windows = self._by_iterm_id.get(iterm_window_id)
+        if id_windows:
+            return next(iter(id_windows.values()))
         return None
 
     def get_last_used_window(self) -> Optional[TrackedWindow]:
@@ -173,14 +218,12 @@ class WindowManager:
         Returns:
             The most recently used window, or None if no windows tracked.
         """
-        if self._last_used_window and self._last_used_window in self.windows:
-            return self.windows[self._last_used_window]
+        window = self.windows.get(self._last_used_window)
+        if window is not None:
+            return window
 
         # Fall back to most recently created
-        if self.windows:
-            return max(self.windows.values(), key=lambda w: w.created_at)
-
-        return None
+        return self.windows.get(self._newest)
 
     def mark_window_used(self, name: str) -> None:
         """
@@ -189,9 +232,9 @@ class WindowManager:
         Args:
             name: The name of the window.
         """
-        if name in self.windows:
+        if name in self.windows and self._last_used_window != name:
             self._last_used_window = name
-            self._save_state()
+            self._schedule_save()
 
     def increment_session_count(self, name: str) -> None:
         """
@@ -200,9 +243,10 @@ class WindowManager:
         Args:
             name: The name of the window.
         """
-        if name in self.windows:
-            self.windows[name].session_count += 1
-            self._save_state()
+        window = self.windows.get(name)
+        if window is not None:
+            window.session_count += 1
+            self._schedule_save()
 
     def decrement_session_count(self, name: str) -> None:
         """
@@ -211,27 +255,30 @@ class WindowManager:
         Args:
             name: The name of the window.
         """
-        if name in self.windows:
-            self.windows[name].session_count = max(0, self.windows[name].session_count - 1)
-            self._save_state()
+        window = self.windows.get(name)
+        if window is not None and window.session_count > 0:
+            window.session_count -= 1
+            self._schedule_save()
 
-    def get_all_windows(self) -> List[TrackedWindow]:
+    def get_all_windows(self) -> ValuesView[TrackedWindow]:
         """
         Get all tracked windows.
 
         Returns:
-            List of all tracked windows.
+            A live view of all tracked windows; wrap it in list() to keep a
+            snapshot or to change windows while iterating.
         """
-        return list(self.windows.values())
+        return self.windows.values()
 
-    def get_window_names(self) -> List[str]:
+    def get_window_names(self) -> KeysView[str]:
         """
         Get all window names.
 
         Returns:
-            List of window names.
+            A live view of the window names; wrap it in list() to keep a
+            snapshot or to change windows while iterating.
         """
-        return list(self.windows.keys())
+        return self.windows.keys()
 
     def update_window_id(self, name: str, new_iterm_window_id: str) -> bool:
         """
@@ -246,37 +293,54 @@ class WindowManager:
         Returns:
             True if window was found and updated, False otherwise.
         """
-        if name in self.windows:
-            self.windows[name].iterm_window_id = new_iterm_window_id
-            self._save_state()
-            return True
-        return False
+        window = self._remove_window(name)
+        if window is None:
+            return False
 
-    def cleanup_stale_windows(self, valid_window_ids: List[str]) -> List[str]:
+        window.iterm_window_id = new_iterm_window_id
+        self._add_window(window)
+        self._schedule_save()
+        return True
+
+    def cleanup_stale_windows(self, valid_window_ids: Iterable[str]) -> List[str]:
         """
         Remove windows that no longer exist in iTerm2.
 
         Args:
-            valid_window_ids: List of currently valid iTerm2 window IDs.
+            valid_window_ids: Currently valid iTerm2 window IDs (any iterable).
 
         Returns:
             List of removed window names.
         """
         removed = []
-        for name, window in list(self.windows.items()):
-            if window.iterm_window_id not in valid_window_ids:
-                del self.windows[name]
+        # keys() - iterable copies the tracked IDs into a set and discards
+        # the valid ones, so valid_window_ids is walked once and never searched
+        for iterm_window_id in self._by_iterm_id.keys() - valid_window_ids:
+            for name in list(self._by_iterm_id[iterm_window_id]):
+                self._remove_window(name)
                 removed.append(name)
 
         if removed:
-            self._save_state()
+            self._schedule_save()
 
         return removed
 
 
+@functools.lru_cache(maxsize=1)
+def get_manager() -> WindowManager:
+    """
+    Get the process-wide WindowManager.
+
+    windows.json is loaded once per process; use this rather than
+    constructing WindowManager directly. get_manager.cache_clear() drops
+    the instance so the next call reloads from disk.
+    """
+    return WindowManager()
+
+
 # CLI for testing
 if __name__ == "__main__":
-    manager = WindowManager()
+    manager = get_manager()
 
     print("Claude HUD - Window Manager Test")
     print("=" * 40)
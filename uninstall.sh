@@ -67,6 +67,7 @@ fi
 # Remove Python scripts
 PYTHON_SCRIPTS=(
     "claude_hud_daemon.py"
+    "hud_common.py"
     "state_detector.py"
     "session_manager.py"
     "socket_listener.py"